@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Round-trip checks for simsam_bpmn_converter.py
+Usage: python3 roundtrip_check.py
+
+Runs small JSON -> BPMN -> JSON conversions in a temp folder and asserts on
+the results. Pins behaviour that is easy to break when optimizing the
+converter. Exits non-zero on the first failing assert.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from simsam_bpmn_converter import SimsamToBPMNFixed
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _round_trip(tmp, elements_text, connections_text='[]', layout_text='{}'):
+    """Convert the given JSON sources to BPMN and back; return (elements, connections)"""
+    conv = SimsamToBPMNFixed()
+    src = {name: os.path.join(tmp, name + '.json') for name in ('elements', 'connections', 'layout')}
+    _write(src['elements'], elements_text)
+    _write(src['connections'], connections_text)
+    _write(src['layout'], layout_text)
+    bpmn = os.path.join(tmp, 'out.bpmn')
+    conv.convert(elements_file=src['elements'], connections_file=src['connections'],
+                 variables_file=os.path.join(tmp, 'missing.json'), layout_file=src['layout'],
+                 output_file=bpmn)
+    return _from_bpmn(tmp, bpmn, conv)
+
+
+def _from_bpmn(tmp, bpmn, conv=None):
+    """Convert a BPMN file back to JSON; return (elements, connections)"""
+    conv = conv or SimsamToBPMNFixed()
+    out = os.path.join(tmp, 'back')
+    conv.convert_bpmn_to_json(
+        bpmn_file=bpmn,
+        out_elements=os.path.join(out, 'elements.json'),
+        out_connections=os.path.join(out, 'connections.json'),
+        out_variables=os.path.join(out, 'variables.json'),
+        out_layout=os.path.join(out, 'layout.json'),
+    )
+    return tuple(_read_json(os.path.join(out, name + '.json')) for name in ('elements', 'connections'))
+
+
+def check_json_edge_values(tmp):
+    """Integers wider than 64 bits and NaN survive the JSON load/dump"""
+    big = 123456789012345678901234
+    elements, _ = _round_trip(tmp, json.dumps([
+        {'id': big, 'name': 'Big', 'type': 'Action', 'avgCost': float('nan'),
+         'account': '00417912345678901234567'},
+    ]))
+    (el,) = elements
+    # the numeric id keeps every digit, so its safe id is unchanged
+    assert el['id'] == SimsamToBPMNFixed().make_xml_safe_id(big) == 'el_' + str(big), el['id']
+    # a long digit string is restored as an int and written out in full
+    assert el['account'] == 417912345678901234567, el['account']
+    # NaN is accepted on input and comes back as its string form
+    assert el['avgCost'] == 'nan', el['avgCost']
+
+
+def check_failed_convert_keeps_output(tmp):
+    """A conversion that fails midway leaves the previous output untouched"""
+    bpmn = os.path.join(tmp, 'out.bpmn')
+    _write(bpmn, 'previous good output')
+    elements = os.path.join(tmp, 'elements.json')
+    connections = os.path.join(tmp, 'connections.json')
+    _write(elements, json.dumps([{'id': 'A', 'name': 'Ok'}, {'name': 'No id'}]))
+    _write(connections, '[]')
+    try:
+        SimsamToBPMNFixed().convert(elements_file=elements, connections_file=connections,
+                                    output_file=bpmn)
+    except KeyError:
+        pass
+    else:
+        raise AssertionError('element without an id should fail')
+    with open(bpmn, 'r', encoding='utf-8') as f:
+        assert f.read() == 'previous good output'
+    assert sorted(os.listdir(tmp)) == ['connections.json', 'elements.json', 'out.bpmn'], os.listdir(tmp)
+
+
+def check_empty_node_list_is_authoritative(tmp):
+    """An empty node list means no positions; the flat id -> {x, y} scan is skipped"""
+    conv = SimsamToBPMNFixed()
+    assert conv._layout_map({'nodes': [], 'a': {'x': 1, 'y': 2}}) == {}
+    assert conv._layout_map({'a': {'x': 1, 'y': 2}}) == {'a': {'x': 1.0, 'y': 2.0}}
+    # a non-empty list under a later key still wins over an empty one
+    assert conv._layout_map({'nodes': [], 'elements': [{'id': 'a', 'x': 1, 'y': 2}]}) == {'a': {'x': 1.0, 'y': 2.0}}
+    # a non-list 'nodes' value is a flat entry, as before
+    assert conv._layout_map({'nodes': {'x': 3, 'y': 4}, 'elements': [{'id': 'a', 'x': 1, 'y': 2}]}) \
+        == {'nodes': {'x': 3.0, 'y': 4.0}}
+
+
+def check_property_types(tmp):
+    """Property values come back typed; anything that is not a plain literal stays a string"""
+    elements, _ = _round_trip(tmp, json.dumps([
+        {'id': 'A', 'name': 'Typed', 'type': 'Action', 'monitoring': True, 'avgCost': 2.5,
+         'incomingNumber': 12, 'platform': 'none', 'account': '1_000', 'kPI': '1e3'},
+    ]))
+    (el,) = elements
+    assert el['monitoring'] is True
+    assert el['avgCost'] == 2.5
+    assert el['incomingNumber'] == 12
+    assert el['platform'] is None
+    # int() accepts digit-group underscores, the restore regex does not
+    assert el['account'] == '1_000', el['account']
+    # an exponent needs a decimal point to count as a float
+    assert el['kPI'] == '1e3', el['kPI']
+
+
+def check_conditions(tmp):
+    """Only Math.random thresholds become probabilities; other conditions are kept raw"""
+    bpmn = os.path.join(tmp, 'in.bpmn')
+    _write(bpmn, '''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://www.omg.org/spec/BPMN/20100524/MODEL"
+  xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <process id="Process_simsam">
+    <task id="A" name="A" />
+    <task id="B" name="B" />
+    <sequenceFlow id="P" sourceRef="A" targetRef="B">
+      <conditionExpression xsi:type="tFormalExpression">${Math.random() &lt;= 0.7}</conditionExpression>
+    </sequenceFlow>
+    <sequenceFlow id="C" sourceRef="A" targetRef="B">
+      <conditionExpression xsi:type="tFormalExpression">${x &lt;= 5}</conditionExpression>
+    </sequenceFlow>
+  </process>
+</definitions>
+''')
+    _, connections = _from_bpmn(tmp, bpmn)
+    prob, cond = connections
+    assert prob['probability'] == 0.7 and prob['condition'] is None, prob
+    assert cond['probability'] is None and cond['condition'] == '${x <= 5}', cond
+
+
+def check_element_key_order(tmp):
+    """Elements come back in schema key order, with unknown properties after the schema"""
+    elements, _ = _round_trip(tmp, json.dumps([
+        {'kPI': 'k', 'custom': 'c', 'description': 'd', 'id': 'A', 'type': 'Action', 'name': 'A'},
+    ]))
+    (el,) = elements
+    schema = SimsamToBPMNFixed().element_schema
+    assert list(el) == schema + ['custom'], list(el)
+
+
+def check_layout_null_coordinates(tmp):
+    """A node with null x/y falls back to its nested position, then bounds"""
+    conv = SimsamToBPMNFixed()
+    layout = {'nodes': [
+        {'id': 'a', 'x': None, 'y': None, 'position': {'x': 3, 'y': 4}},
+        {'id': 'b', 'x': 1, 'y': None, 'bounds': {'x': 5, 'y': 6}},
+        {'id': 'c', 'x': None, 'y': 2},
+    ]}
+    assert conv._layout_map(layout) == {'a': {'x': 3.0, 'y': 4.0}, 'b': {'x': 5.0, 'y': 6.0}}
+
+
+def check_reverse_document_structure(tmp):
+    """Reverse mode reads only direct children of the first process and the first DI plane"""
+    bpmn = os.path.join(tmp, 'in.bpmn')
+    _write(bpmn, '''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://www.omg.org/spec/BPMN/20100524/MODEL"
+  xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI"
+  xmlns:dc="http://www.omg.org/spec/DD/20100524/DC">
+  <bpmndi:BPMNDiagram id="D1">
+    <bpmndi:BPMNPlane id="P1" bpmnElement="Process_1">
+      <bpmndi:BPMNShape id="DI_A" bpmnElement="A"><dc:Bounds x="10" y="20" width="100" height="80" /></bpmndi:BPMNShape>
+      <bpmndi:BPMNShape id="DI_B" bpmnElement="B"><dc:Bounds x="abc" y="20" width="100" height="80" /></bpmndi:BPMNShape>
+    </bpmndi:BPMNPlane>
+    <bpmndi:BPMNPlane id="P2" bpmnElement="Process_2">
+      <bpmndi:BPMNShape id="DI_X" bpmnElement="X"><dc:Bounds x="1" y="2" width="100" height="80" /></bpmndi:BPMNShape>
+    </bpmndi:BPMNPlane>
+  </bpmndi:BPMNDiagram>
+  <process id="Process_1">
+    <!-- a comment between flow nodes -->
+    <task id="A" name="A" />
+    <subProcess id="S" name="S">
+      <task id="N" name="Nested" />
+      <sequenceFlow id="NF" sourceRef="N" targetRef="N" />
+    </subProcess>
+    <!-- another comment -->
+    <task id="B" name="B" />
+    <sequenceFlow id="AB" sourceRef="A" targetRef="B" />
+  </process>
+  <process id="Process_2">
+    <task id="X" name="X" />
+    <sequenceFlow id="XA" sourceRef="X" targetRef="A" />
+  </process>
+</definitions>
+''')
+    elements, connections = _from_bpmn(tmp, bpmn)
+    assert [e['id'] for e in elements] == ['A', 'B'], elements
+    assert [c['id'] for c in connections] == ['AB'], connections
+    layout = _read_json(os.path.join(tmp, 'back', 'layout.json'))
+    # B's bounds are not numeric, and the second plane is ignored
+    assert layout == {'nodes': [{'id': 'A', 'x': 10.0, 'y': 20.0}]}, layout
+
+
+CHECKS = [
+    check_json_edge_values,
+    check_failed_convert_keeps_output,
+    check_empty_node_list_is_authoritative,
+    check_property_types,
+    check_conditions,
+    check_element_key_order,
+    check_layout_null_coordinates,
+    check_reverse_document_structure,
+]
+
+
+if __name__ == '__main__':
+    for check in CHECKS:
+        with tempfile.TemporaryDirectory() as tmp:
+            check(tmp)
+        print(f"✅ {check.__name__}")
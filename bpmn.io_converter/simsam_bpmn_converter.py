@@ -10,6 +10,7 @@ Conventions (folders):
 - (Future) Write generated JSON to: toZ1M/
 """
 
+import functools
 import json
 import re
 import math
@@ -18,9 +19,126 @@ import sys
 import argparse
 import xml.etree.ElementTree as ET
 
+# Control characters that are not allowed in XML 1.0
+_CTRL_RE = re.compile(r'[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]')
+# Anything outside the characters we allow in generated XML ids
+_UNSAFE_ID_RE = re.compile(r'[^a-zA-Z0-9_.-]')
+# Single-character XML escapes and whitespace flattening ('&' is handled separately)
+_ESC_TABLE = str.maketrans({
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&apos;',
+    '\n': ' ',
+    '\r': ' ',
+    '\t': ' ',
+})
+# Classifies a stripped simsam:property value so reverse mode can restore its type
+_VALUE_RE = re.compile(
+    r'(?P<true>true)|(?P<false>false)|(?P<none>none|null)'
+    r'|(?P<int>[+-]?\d+)'
+    r'|(?P<float>[+-]?(?:\d+\.\d*|\.\d+)(?:e[+-]?\d+)?)',
+    re.IGNORECASE
+)
+# Threshold in a generated probability condition such as ${Math.random() <= 0.7}
+_PROB_RE = re.compile(r"<=\s*([0-9]*\.?[0-9]+)")
+
+
+# Bounded: property values are mostly unique, so an unbounded cache would
+# grow with the document
+@functools.lru_cache(maxsize=4096)
+def _escape_xml(text):
+    """Cached worker for SimsamToBPMNFixed.escape_xml_thoroughly (str input)"""
+    text = text.replace('&', '&amp;')  # Must be first
+    # Collapse CRLF to a single space before the one-pass table
+    text = text.replace('\r\n', ' ').translate(_ESC_TABLE)
+
+    # Remove control characters
+    text = _CTRL_RE.sub('', text)
+
+    return text.strip()
+
+
+# Unbounded: ids and property keys repeat throughout a document
+@functools.lru_cache(maxsize=None)
+def _safe_xml_id(id_string):
+    """Cached worker for SimsamToBPMNFixed.make_xml_safe_id (str input)"""
+    safe_id = _UNSAFE_ID_RE.sub('_', id_string.strip())
+
+    if safe_id and not (safe_id[0].isalpha() or safe_id[0] == '_'):
+        safe_id = 'el_' + safe_id
+
+    return safe_id or 'element_1'
+
+
+# Clark-notation ({namespace}local) names for the BPMN tags read back in reverse mode
+_BPMN_NS = '{http://www.omg.org/spec/BPMN/20100524/MODEL}'
+_BPMNDI_NS = '{http://www.omg.org/spec/BPMN/20100524/DI}'
+_DC_NS = '{http://www.omg.org/spec/DD/20100524/DC}'
+_SIMSAM_NS = '{http://simsam.process/extension}'
+
+_PROCESS_TAG = _BPMN_NS + 'process'
+_SEQFLOW_TAG = _BPMN_NS + 'sequenceFlow'
+_CONDEXPR_TAG = _BPMN_NS + 'conditionExpression'
+_EXTENSION_TAG = _BPMN_NS + 'extensionElements'
+_SIMSAM_PROPS_TAG = _SIMSAM_NS + 'properties'
+_SIMSAM_PROP_TAG = _SIMSAM_NS + 'property'
+_DIAGRAM_TAG = _BPMNDI_NS + 'BPMNDiagram'
+_PLANE_TAG = _BPMNDI_NS + 'BPMNPlane'
+_SHAPE_TAG = _BPMNDI_NS + 'BPMNShape'
+_BOUNDS_TAG = _DC_NS + 'Bounds'
+
+# Where a layout entry may nest its coordinates, tried in order after the entry itself
+_NODE_POSITION_KEYS = ('position', 'bounds')
+_FLAT_POSITION_KEYS = ('position',)
+# Keys under which a layout may hold a list of node entries
+_NODE_LIST_KEYS = ('nodes', 'elements', 'items')
+
+
+def _layout_xy(entry, nested_keys):
+    """Return the first complete raw (x, y) pair on entry or under nested_keys, else None"""
+    x, y = entry.get('x'), entry.get('y')
+    if x is not None and y is not None:
+        return x, y
+    for key in nested_keys:
+        pos = entry.get(key)
+        if isinstance(pos, dict):
+            x, y = pos.get('x'), pos.get('y')
+            if x is not None and y is not None:
+                return x, y
+    return None
+
+
+def _load_json(path):
+    """Load a UTF-8 JSON file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _dump_json(obj, path):
+    """Write obj as 2-space indented UTF-8 JSON"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, indent=2, ensure_ascii=False)
+
+
 class SimsamToBPMNFixed:
     """Fixed converter that handles XML parsing issues robustly"""
 
+    # Static start of every generated document, up to the opening <process>
+    XML_HEADER = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<definitions xmlns="http://www.omg.org/spec/BPMN/20100524/MODEL"\n'
+        '  xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI"\n'
+        '  xmlns:dc="http://www.omg.org/spec/DD/20100524/DC"\n'
+        '  xmlns:di="http://www.omg.org/spec/DD/20100524/DI"\n'
+        '  xmlns:simsam="http://simsam.process/extension"\n'
+        '  xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"\n'
+        '  id="Definitions_simsam"\n'
+        '  targetNamespace="http://bpmn.io/schema/bpmn">\n'
+        '\n'
+        '  <process id="Process_simsam" isExecutable="false">\n'
+    )
+
     def __init__(self):
         self.type_mapping = {
             "Resource": "startEvent",
@@ -56,6 +174,22 @@ class SimsamToBPMNFixed:
             'id', 'fromId', 'toId', 'probability', 'time', 'condition',
             'execution', 'AOR', 'type', 'description\r'
         ]
+        # All-None records in schema order, copied for each row read back
+        self._element_template = dict.fromkeys(self.element_schema)
+        self._conn_template = dict.fromkeys(self.connection_schema)
+
+        # Reverse mapping from BPMN element tag (Clark notation) to Simsam type.
+        # Reverse conversion writes elements grouped in this order.
+        self.bpmn_tag_to_type = {
+            _BPMN_NS + 'startEvent': 'Resource',
+            _BPMN_NS + 'endEvent': 'State',
+            _BPMN_NS + 'exclusiveGateway': 'Decision',
+            _BPMN_NS + 'task': 'Action',
+            _BPMN_NS + 'userTask': 'Action',
+            _BPMN_NS + 'serviceTask': 'Action',
+            _BPMN_NS + 'sendTask': 'Action',
+            _BPMN_NS + 'receiveTask': 'Action',
+        }
 
     def _layout_map(self, layout):
         """Extract a simple id -> {x,y} map from various layout JSON shapes"""
@@ -66,42 +200,39 @@ class SimsamToBPMNFixed:
         nodes = layout.get('nodes') or layout.get('elements') or layout.get('items')
         if isinstance(nodes, list):
             for n in nodes:
+                if not isinstance(n, dict):
+                    continue
+                eid = n.get('id') or n.get('key') or n.get('elementId')
+                if not eid:
+                    continue
+                xy = _layout_xy(n, _NODE_POSITION_KEYS)
+                if xy is None:
+                    continue
                 try:
-                    eid = n.get('id') or n.get('key') or n.get('elementId')
-                    if not eid:
-                        continue
-                    if 'x' in n and 'y' in n:
-                        lm[str(eid)] = {'x': float(n['x']), 'y': float(n['y'])}
-                    elif isinstance(n.get('position'), dict) and {'x', 'y'} <= set(n['position'].keys()):
-                        lm[str(eid)] = {
-                            'x': float(n['position']['x']),
-                            'y': float(n['position']['y'])
-                        }
-                    elif isinstance(n.get('bounds'), dict) and {'x', 'y'} <= set(n['bounds'].keys()):
-                        lm[str(eid)] = {
-                            'x': float(n['bounds']['x']),
-                            'y': float(n['bounds']['y'])
-                        }
+                    lm[str(eid)] = {'x': float(xy[0]), 'y': float(xy[1])}
                 except Exception:
-                    # ignore malformed node entries
+                    # ignore malformed coordinates
                     pass
+            return lm
+        # only empty node lists: no positions, not a flat dict
+        if not nodes and any(isinstance(layout.get(k), list) for k in _NODE_LIST_KEYS):
+            return lm
 
-        if not lm:
-            # flat dict: { id: { x, y } }
-            for k, v in layout.items():
-                try:
-                    if isinstance(v, dict) and ('x' in v and 'y' in v):
-                        lm[str(k)] = {'x': float(v['x']), 'y': float(v['y'])}
-                    elif isinstance(v, dict) and isinstance(v.get('position'), dict):
-                        p = v['position']
-                        if 'x' in p and 'y' in p:
-                            lm[str(k)] = {'x': float(p['x']), 'y': float(p['y'])}
-                except Exception:
-                    pass
+        # flat dict: { id: { x, y } }
+        for k, v in layout.items():
+            if not isinstance(v, dict):
+                continue
+            xy = _layout_xy(v, _FLAT_POSITION_KEYS)
+            if xy is None:
+                continue
+            try:
+                lm[str(k)] = {'x': float(xy[0]), 'y': float(xy[1])}
+            except Exception:
+                pass
         return lm
 
-    def _build_di(self, element_infos, connection_infos, layout):
-        """Build BPMN DI so the diagram renders in bpmn.io"""
+    def _build_di(self, buf, element_infos, connection_infos, layout):
+        """Write BPMN DI to buf so the diagram renders in bpmn.io"""
         size_map = {
             'startEvent': (36, 36),
             'endEvent': (36, 36),
@@ -121,132 +252,152 @@ class SimsamToBPMNFixed:
         h_gap, v_gap = 200, 150
         x0, y0 = 100, 100
 
-        # assign bounds
+        # assign bounds as (x, y, w, h); edges join shape centres, so work
+        # those out once per element
         bounds = {}
+        centers = {}
         for idx, info in enumerate(element_infos):
             eid = info['id']
             bpmn_type = info['bpmn_type']
             w, h = size_map.get(bpmn_type, (100, 80))
 
-            if eid in layout_map:
-                x = layout_map[eid]['x']
-                y = layout_map[eid]['y']
+            pos = layout_map.get(eid)
+            if pos is not None:
+                x = pos['x']
+                y = pos['y']
             else:
                 col = idx % cols
                 row = idx // cols
                 x = x0 + col * h_gap
                 y = y0 + row * v_gap
 
-            bounds[eid] = {'x': float(x), 'y': float(y), 'w': float(w), 'h': float(h)}
+            x, y, w, h = float(x), float(y), float(w), float(h)
+            bounds[eid] = (x, y, w, h)
+            centers[eid] = (x + w / 2.0, y + h / 2.0)
 
-        di_lines = []
-        di_lines.append('  <bpmndi:BPMNDiagram id="BPMNDiagram_1">')
-        di_lines.append('    <bpmndi:BPMNPlane id="BPMNPlane_1" bpmnElement="Process_simsam">')
+        buf.write('  <bpmndi:BPMNDiagram id="BPMNDiagram_1">\n')
+        buf.write('    <bpmndi:BPMNPlane id="BPMNPlane_1" bpmnElement="Process_simsam">\n')
 
         # shapes
-        for eid, b in bounds.items():
-            di_lines.append(f'      <bpmndi:BPMNShape id="DI_{eid}" bpmnElement="{eid}">')
-            di_lines.append(f'        <dc:Bounds x="{b["x"]:.1f}" y="{b["y"]:.1f}" width="{b["w"]:.1f}" height="{b["h"]:.1f}" />')
-            di_lines.append('      </bpmndi:BPMNShape>')
+        buf.write(''.join(
+            f'      <bpmndi:BPMNShape id="DI_{eid}" bpmnElement="{eid}">\n'
+            f'        <dc:Bounds x="{x:.1f}" y="{y:.1f}" width="{w:.1f}" height="{h:.1f}" />\n'
+            '      </bpmndi:BPMNShape>\n'
+            for eid, (x, y, w, h) in bounds.items()
+        ))
 
         # edges
+        center_of = centers.get
         for conn in connection_infos:
             cid = conn['id']
-            s = bounds.get(conn['source'])
-            t = bounds.get(conn['target'])
-            if not s or not t:
+            s = center_of(conn['source'])
+            t = center_of(conn['target'])
+            if s is None or t is None:
                 continue
-            sx = s['x'] + s['w'] / 2.0
-            sy = s['y'] + s['h'] / 2.0
-            tx = t['x'] + t['w'] / 2.0
-            ty = t['y'] + t['h'] / 2.0
+            sx, sy = s
+            tx, ty = t
 
-            di_lines.append(f'      <bpmndi:BPMNEdge id="DI_{cid}" bpmnElement="{cid}">')
-            di_lines.append(f'        <di:waypoint x="{sx:.1f}" y="{sy:.1f}" />')
-            di_lines.append(f'        <di:waypoint x="{tx:.1f}" y="{ty:.1f}" />')
-            di_lines.append('      </bpmndi:BPMNEdge>')
+            buf.write(
+                f'      <bpmndi:BPMNEdge id="DI_{cid}" bpmnElement="{cid}">\n'
+                f'        <di:waypoint x="{sx:.1f}" y="{sy:.1f}" />\n'
+                f'        <di:waypoint x="{tx:.1f}" y="{ty:.1f}" />\n'
+                '      </bpmndi:BPMNEdge>\n'
+            )
 
-        di_lines.append('    </bpmndi:BPMNPlane>')
-        di_lines.append('  </bpmndi:BPMNDiagram>')
-        return di_lines
+        buf.write('    </bpmndi:BPMNPlane>\n')
+        buf.write('  </bpmndi:BPMNDiagram>\n')
 
     def escape_xml_thoroughly(self, text):
         """Thoroughly escape XML special characters"""
         if not text:
             return ""
-
-        text = str(text)
-
-        replacements = [
-            ('&', '&amp;'),  # Must be first
-            ('<', '&lt;'),
-            ('>', '&gt;'),
-            ('"', '&quot;'),
-            ("'", '&apos;'),
-            ('\r\n', ' '),
-            ('\n', ' '),
-            ('\r', ' '),
-            ('\t', ' '),
-        ]
-
-        for old, new in replacements:
-            text = text.replace(old, new)
-
-        # Remove control characters
-        text = re.sub(r'[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]', '', text)
-
-        return text.strip()
+        return _escape_xml(str(text))
 
     def make_xml_safe_id(self, id_string):
         """Make ID safe for XML"""
         if not id_string:
             return "element_1"
+        return _safe_xml_id(str(id_string))
 
-        safe_id = str(id_string).strip()
-        safe_id = re.sub(r'[^a-zA-Z0-9_.-]', '_', safe_id)
-
-        if safe_id and not (safe_id[0].isalpha() or safe_id[0] == '_'):
-            safe_id = 'el_' + safe_id
-
-        return safe_id or 'element_1'
-
-    def _parse_simsam_properties(self, xml_element, ns):
+    def _parse_simsam_properties(self, xml_element):
         """Read back simsam extension properties into a dict"""
         props = {}
         if xml_element is None:
             return props
-        ext = xml_element.find('bpmn:extensionElements', ns)
+        ext = xml_element.find(_EXTENSION_TAG)
         if ext is None:
             return props
-        props_el = ext.find('simsam:properties', ns)
+        props_el = ext.find(_SIMSAM_PROPS_TAG)
         if props_el is None:
             return props
-        for p in props_el.findall('simsam:property', ns):
+        for p in props_el.findall(_SIMSAM_PROP_TAG):
             name = p.get('name')
             value = p.get('value')
             if name is None:
                 continue
             # try restore types (int/float/bool/null)
             if isinstance(value, str):
-                v = value.strip()
-                if v.lower() == 'true':
+                m = _VALUE_RE.fullmatch(value.strip())
+                kind = m.lastgroup if m else None
+                if kind == 'true':
                     props[name] = True
-                elif v.lower() == 'false':
+                elif kind == 'false':
                     props[name] = False
-                elif v.lower() in ('none', 'null'):
+                elif kind == 'none':
                     props[name] = None
+                elif kind == 'int':
+                    props[name] = int(m.group())
+                elif kind == 'float':
+                    props[name] = float(m.group())
                 else:
-                    try:
-                        if '.' in v:
-                            props[name] = float(v)
-                        else:
-                            props[name] = int(v)
-                    except Exception:
-                        props[name] = value
+                    props[name] = value
             else:
                 props[name] = value
         return props
 
+    def _element_record(self, el, simsam_type):
+        """Build a schema-padded Simsam element dict from a BPMN flow node"""
+        rec = self._element_template.copy()
+        # Merge extension properties back (may include subType and other metadata)
+        rec.update(self._parse_simsam_properties(el))
+        # Base fields go last so properties cannot clobber them
+        rec['id'] = el.get('id') or ''
+        rec['name'] = el.get('name') or ''
+        rec['type'] = simsam_type
+        return rec
+
+    def _connection_record(self, sf):
+        """Build a schema-padded Simsam connection dict from a BPMN sequenceFlow"""
+        conn = self._conn_template.copy()
+        conn['id'] = sf.get('id') or ''
+        conn['fromId'] = sf.get('sourceRef') or ''
+        conn['toId'] = sf.get('targetRef') or ''
+        cond = sf.find(_CONDEXPR_TAG)
+        if cond is not None and cond.text:
+            txt = cond.text.strip()
+            # Expect pattern like ${Math.random() <= 0.7}
+            m = _PROB_RE.search(txt) if 'Math.random' in txt else None
+            if m:
+                try:
+                    conn['probability'] = float(m.group(1))
+                except Exception:
+                    pass
+            else:
+                # Store raw condition if not a probability threshold
+                conn['condition'] = txt
+        return conn
+
+    def _layout_node(self, sh):
+        """Read {id, x, y} from a BPMNShape, or None if it has no usable bounds"""
+        be = sh.get('bpmnElement')
+        b = sh.find(_BOUNDS_TAG)
+        if not be or b is None:
+            return None
+        try:
+            return {'id': be, 'x': float(b.get('x')), 'y': float(b.get('y'))}
+        except Exception:
+            return None
+
     def convert(self, elements_file='fromZ1M/elements.json', connections_file='fromZ1M/connections.json', 
                 variables_file='fromZ1M/variables.json', layout_file='fromZ1M/default.json', 
                 output_file='toBPMN/simsam_fixed.bpmn'):
@@ -255,20 +406,16 @@ class SimsamToBPMNFixed:
         print(f"Converting {elements_file} + {connections_file} -> {output_file}")
 
         # Load data
-        with open(elements_file, 'r', encoding='utf-8') as f:
-            elements = json.load(f)
-        with open(connections_file, 'r', encoding='utf-8') as f:
-            connections = json.load(f)
+        elements = _load_json(elements_file)
+        connections = _load_json(connections_file)
 
         try:
-            with open(variables_file, 'r', encoding='utf-8') as f:
-                variables = json.load(f)
+            variables = _load_json(variables_file)
         except:
             variables = {}
 
         try:
-            with open(layout_file, 'r', encoding='utf-8') as f:
-                layout = json.load(f)
+            layout = _load_json(layout_file)
         except:
             layout = {}
 
@@ -277,102 +424,99 @@ class SimsamToBPMNFixed:
         if out_dir:
             os.makedirs(out_dir, exist_ok=True)
 
-        # Create XML
-        xml_lines = [
-            '<?xml version="1.0" encoding="UTF-8"?>',
-            '<definitions xmlns="http://www.omg.org/spec/BPMN/20100524/MODEL"',
-            '  xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI"',
-            '  xmlns:dc="http://www.omg.org/spec/DD/20100524/DC"',
-            '  xmlns:di="http://www.omg.org/spec/DD/20100524/DI"',
-            '  xmlns:simsam="http://simsam.process/extension"',
-            '  xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"',
-            '  id="Definitions_simsam"',
-            '  targetNamespace="http://bpmn.io/schema/bpmn">',
-            '',
-            '  <process id="Process_simsam" isExecutable="false">'
-        ]
-
-        # Collect info for DI
-        element_infos = []
-
-        # Process elements
-        for element in elements:
-            element_type = element.get("type", "Action")
-            subtype = element.get("subType", "")
-
-            if subtype in self.subtype_mapping:
-                bpmn_type = self.subtype_mapping[subtype]
-            else:
-                bpmn_type = self.type_mapping.get(element_type, "task")
-
-            element_id = self.make_xml_safe_id(element["id"])
-            element_name = self.escape_xml_thoroughly(element.get("name", ""))
-
-            xml_lines.append(f'    <{bpmn_type} id="{element_id}" name="{element_name}">')
-
-            # Add properties
-            skip_props = {"id", "name", "type"}
-            custom_props = {k: v for k, v in element.items() 
-                           if k not in skip_props and v is not None and str(v).strip()}
-
-            if custom_props:
-                xml_lines.extend([
-                    '      <extensionElements>',
-                    '        <simsam:properties>'
-                ])
-                for key, value in custom_props.items():
-                    safe_key = self.make_xml_safe_id(str(key))
-                    safe_value = self.escape_xml_thoroughly(str(value))
-                    if safe_value:
-                        xml_lines.append(f'          <simsam:property name="{safe_key}" value="{safe_value}" />')
-                xml_lines.extend([
-                    '        </simsam:properties>',
-                    '      </extensionElements>'
-                ])
-
-            xml_lines.append(f'    </{bpmn_type}>')
-            xml_lines.append('')
-
-            # collect for DI
-            element_infos.append({'id': element_id, 'bpmn_type': bpmn_type})
-
-        # Collect connections for DI
-        connection_infos = []
-
-        # Process connections
-        for connection in connections:
-            conn_id = self.make_xml_safe_id(connection["id"].replace('->', '_to_'))
-            source_ref = self.make_xml_safe_id(connection["fromId"])
-            target_ref = self.make_xml_safe_id(connection["toId"])
-
-            xml_lines.append(f'    <sequenceFlow id="{conn_id}" sourceRef="{source_ref}" targetRef="{target_ref}">')
-
-            # Handle probability
-            prob = connection.get("probability")
-            if prob is not None and str(prob).strip() not in ["", "None", "1"]:
-                xml_lines.extend([
-                    '      <conditionExpression xsi:type="tFormalExpression">',
-                    f'        ${{Math.random() &lt;= {prob}}}',
-                    '      </conditionExpression>'
-                ])
-
-            xml_lines.append('    </sequenceFlow>')
-            xml_lines.append('')
-
-            connection_infos.append({'id': conn_id, 'source': source_ref, 'target': target_ref})
-
-        xml_lines.extend([
-            '  </process>'
-        ])
-
-        # Add BPMN DI so bpmn.io can display the diagram
-        xml_lines.extend(self._build_di(element_infos, connection_infos, layout))
-
-        xml_lines.append('</definitions>')
+        # Stream XML into a temp file beside the output and swap it in once the
+        # document is complete, so a failure never leaves a truncated file behind
+        tmp_file = f'{output_file}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8', buffering=1 << 20) as buf:
+                buf.write(self.XML_HEADER)
+
+                # Collect info for DI
+                element_infos = []
+                skip_props = {"id", "name", "type"}
+                # Closing tag plus blank separator line for every BPMN type we can emit
+                close_tags = {
+                    t: f'    </{t}>\n\n'
+                    for t in {'task', *self.type_mapping.values(), *self.subtype_mapping.values()}
+                }
 
-        # Save file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(xml_lines))
+                # Process elements
+                for element in elements:
+                    element_type = element.get("type", "Action")
+                    subtype = element.get("subType", "")
+
+                    if subtype in self.subtype_mapping:
+                        bpmn_type = self.subtype_mapping[subtype]
+                    else:
+                        bpmn_type = self.type_mapping.get(element_type, "task")
+
+                    element_id = self.make_xml_safe_id(element["id"])
+                    element_name = self.escape_xml_thoroughly(element.get("name", ""))
+
+                    buf.write(f'    <{bpmn_type} id="{element_id}" name="{element_name}">\n')
+
+                    # Add properties (extension block is opened on the first non-empty one)
+                    has_props = False
+                    for key, value in element.items():
+                        if key in skip_props or value is None:
+                            continue
+                        str_value = str(value)
+                        if not str_value.strip():
+                            continue
+                        if not has_props:
+                            buf.write('      <extensionElements>\n')
+                            buf.write('        <simsam:properties>\n')
+                            has_props = True
+                        safe_key = self.make_xml_safe_id(str(key))
+                        safe_value = self.escape_xml_thoroughly(str_value)
+                        if safe_value:
+                            buf.write(f'          <simsam:property name="{safe_key}" value="{safe_value}" />\n')
+
+                    if has_props:
+                        buf.write('        </simsam:properties>\n')
+                        buf.write('      </extensionElements>\n')
+
+                    buf.write(close_tags[bpmn_type])
+
+                    # collect for DI
+                    element_infos.append({'id': element_id, 'bpmn_type': bpmn_type})
+
+                # Collect connections for DI
+                connection_infos = []
+
+                # Process connections
+                for connection in connections:
+                    conn_id = self.make_xml_safe_id(connection["id"].replace('->', '_to_'))
+                    source_ref = self.make_xml_safe_id(connection["fromId"])
+                    target_ref = self.make_xml_safe_id(connection["toId"])
+
+                    buf.write(f'    <sequenceFlow id="{conn_id}" sourceRef="{source_ref}" targetRef="{target_ref}">\n')
+
+                    # Handle probability
+                    prob = connection.get("probability")
+                    if prob is not None and str(prob).strip() not in ["", "None", "1"]:
+                        buf.write('      <conditionExpression xsi:type="tFormalExpression">\n')
+                        buf.write(f'        ${{Math.random() &lt;= {prob}}}\n')
+                        buf.write('      </conditionExpression>\n')
+
+                    buf.write('    </sequenceFlow>\n')
+                    buf.write('\n')
+
+                    connection_infos.append({'id': conn_id, 'source': source_ref, 'target': target_ref})
+
+                buf.write('  </process>\n')
+
+                # Add BPMN DI so bpmn.io can display the diagram
+                self._build_di(buf, element_infos, connection_infos, layout)
+
+                buf.write('</definitions>\n')
+            os.replace(tmp_file, output_file)
+        except BaseException:
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+            raise
 
         print(f"✅ Successfully created {output_file}")
         print(f"   Elements: {len(elements)}")
@@ -397,111 +541,56 @@ class SimsamToBPMNFixed:
 
         print(f"Converting {bpmn_file} -> {out_elements}, {out_connections}, {out_layout}")
 
-        ns = {
-            'bpmn': 'http://www.omg.org/spec/BPMN/20100524/MODEL',
-            'bpmndi': 'http://www.omg.org/spec/BPMN/20100524/DI',
-            'dc': 'http://www.omg.org/spec/DD/20100524/DC',
-            'di': 'http://www.omg.org/spec/DD/20100524/DI',
-            'simsam': 'http://simsam.process/extension',
-            'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
-        }
-
-        tree = ET.parse(bpmn_file)
-        root = tree.getroot()
-
-        process = root.find('bpmn:process', ns)
-        if process is None:
-            raise RuntimeError('No <bpmn:process> found in BPMN file')
-
-        # Reverse mapping from BPMN element to Simsam type
-        bpmn_to_type = {
-            'startEvent': 'Resource',
-            'endEvent': 'State',
-            'exclusiveGateway': 'Decision',
-            'task': 'Action',
-            'userTask': 'Action',
-            'serviceTask': 'Action',
-            'sendTask': 'Action',
-            'receiveTask': 'Action',
-        }
-
-        # Elements (collect, then pad schema)
-        elements = []
-        element_tags = ['startEvent', 'endEvent', 'exclusiveGateway', 'task', 'userTask', 'serviceTask', 'sendTask', 'receiveTask']
-        for tag in element_tags:
-            for el in process.findall(f'bpmn:{tag}', ns):
-                eid = el.get('id') or ''
-                name = el.get('name') or ''
-                simsam_type = bpmn_to_type.get(tag, 'Action')
-                props = self._parse_simsam_properties(el, ns)
-
-                # Base element record
-                rec = {
-                    'id': eid,
-                    'name': name,
-                    'type': simsam_type,
-                }
-                # Merge extension properties back (may include subType and other metadata)
-                for k, v in props.items():
-                    # Avoid clobbering the base id/name/type accidentally
-                    if k in ('id', 'name', 'type'):
-                        continue
-                    rec[k] = v
-
-                # Ensure all expected element fields exist
-                for fld in self.element_schema:
-                    if fld not in rec:
-                        rec[fld] = None
+        # Elements grouped by BPMN tag, in bpmn_tag_to_type order
+        by_tag = {tag: [] for tag in self.bpmn_tag_to_type}
+        connections = []
+        layout_nodes = []
 
-                elements.append(rec)
+        # Stream the file and only keep what we need: direct children of the
+        # first <process> and of the first DI plane are read at their end
+        # event and then cleared. States: 0 = not seen, 1 = inside, 2 = done.
+        depth = 0
+        top_tag = None
+        process_state = plane_state = 0
+        for event, el in ET.iterparse(bpmn_file, events=('start', 'end')):
+            tag = el.tag
+            if event == 'start':
+                depth += 1
+                if depth == 2:
+                    top_tag = tag
+                    if tag == _PROCESS_TAG and process_state == 0:
+                        process_state = 1
+                elif depth == 3 and tag == _PLANE_TAG and top_tag == _DIAGRAM_TAG and plane_state == 0:
+                    plane_state = 1
+                continue
 
-        # Connections (collect, then pad schema)
-        connections = []
-        for sf in process.findall('bpmn:sequenceFlow', ns):
-            cid = sf.get('id') or ''
-            src = sf.get('sourceRef') or ''
-            tgt = sf.get('targetRef') or ''
-            conn = {
-                'id': cid,
-                'fromId': src,
-                'toId': tgt,
-                'probability': None,
-                'time': None,
-                'condition': None,
-                'execution': None,
-                'AOR': None,
-                'type': None,
-                'description\r': None,
-            }
-            cond = sf.find('bpmn:conditionExpression', ns)
-            if cond is not None and cond.text:
-                txt = cond.text.strip()
-                # Expect pattern like ${Math.random() <= 0.7}
-                m = re.search(r"<=\s*([0-9]*\.?[0-9]+)", txt)
-                if m:
-                    try:
-                        conn['probability'] = float(m.group(1))
-                    except Exception:
-                        pass
+            level = depth
+            depth -= 1
+            if level == 3 and process_state == 1:
+                if tag == _SEQFLOW_TAG:
+                    connections.append(self._connection_record(el))
                 else:
-                    # Store raw condition if not a probability threshold
-                    conn['condition'] = txt
-            connections.append(conn)
+                    bucket = by_tag.get(tag)
+                    if bucket is not None:
+                        bucket.append(self._element_record(el, self.bpmn_tag_to_type[tag]))
+                el.clear()
+            elif level == 4 and plane_state == 1:
+                if tag == _SHAPE_TAG:
+                    node = self._layout_node(el)
+                    if node is not None:
+                        layout_nodes.append(node)
+                el.clear()
+            elif level == 2 and process_state == 1:
+                process_state = 2
+                el.clear()
+            elif level == 3 and plane_state == 1:
+                plane_state = 2
+                el.clear()
+
+        if process_state == 0:
+            raise RuntimeError('No <bpmn:process> found in BPMN file')
 
-        # Layout from BPMN DI
-        layout_nodes = []
-        plane = root.find('bpmndi:BPMNDiagram/bpmndi:BPMNPlane', ns)
-        if plane is not None:
-            for sh in plane.findall('bpmndi:BPMNShape', ns):
-                be = sh.get('bpmnElement')
-                b = sh.find('dc:Bounds', ns)
-                if be and b is not None:
-                    try:
-                        x = float(b.get('x'))
-                        y = float(b.get('y'))
-                        layout_nodes.append({'id': be, 'x': x, 'y': y})
-                    except Exception:
-                        continue
+        elements = [rec for recs in by_tag.values() for rec in recs]
 
         layout = {'nodes': layout_nodes} if layout_nodes else {}
 
@@ -512,14 +601,10 @@ class SimsamToBPMNFixed:
                 os.makedirs(d, exist_ok=True)
 
         # Write files
-        with open(out_elements, 'w', encoding='utf-8') as f:
-            json.dump(elements, f, indent=2, ensure_ascii=False)
-        with open(out_connections, 'w', encoding='utf-8') as f:
-            json.dump(connections, f, indent=2, ensure_ascii=False)
-        with open(out_variables, 'w', encoding='utf-8') as f:
-            json.dump({}, f, indent=2, ensure_ascii=False)
-        with open(out_layout, 'w', encoding='utf-8') as f:
-            json.dump(layout, f, indent=2, ensure_ascii=False)
+        _dump_json(elements, out_elements)
+        _dump_json(connections, out_connections)
+        _dump_json({}, out_variables)
+        _dump_json(layout, out_layout)
 
         print(f"✅ Wrote: {out_elements}, {out_connections}, {out_variables}, {out_layout}")
         print(f"   Elements: {len(elements)} | Connections: {len(connections)} | Layout nodes: {len(layout_nodes)}")